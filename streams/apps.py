@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class StreamsConfig(AppConfig):
     name = 'streams'
+
+    def ready(self):
+        # Fail at startup, not inside a pipeline thread, on a bad CAMERA_STORAGE_MAP
+        from .storage import validate_storage_config
+        validate_storage_config()
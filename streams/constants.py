@@ -21,6 +21,15 @@ VALID_API_KEYS = ['myapikey']    # Change 'myapikey' to something secure!
 
 SEGMENT_DURATION = 3  # seconds
 
+# Per camera/day seek index written next to the segments, sorted by start:
+#   [[segment, start_ts, duration, media_duration], ...]
+# start_ts is the UNIX wall-clock time of the chunk's first frame and duration
+# its wall-clock span; media_duration is the playback length of segment_<n>.ts.
+SEEK_INDEX_FILE = "seek_index.json"
+# A seek falling between two rows belongs to the earlier one unless the gap is
+# longer than this (seconds), which means the camera was actually down.
+SEEK_MAX_GAP = 1.0
+
 # Store camera start times for windowing
 CAMERA_START_TS = {}
 
@@ -11,11 +11,12 @@ import datetime
 #from ultralytics import YOLO
 import random
 from django.core.management.base import BaseCommand
+from streams.constants import SEEK_INDEX_FILE
+from streams.storage import get_camera_root, find_camera_folder
 
 # === Configuration ===
 SEGMENT_DURATION = 2         # seconds per HLS segment
 FPS = 30                     # target frames per second
-MEDIA_ROOT = os.path.join(os.getcwd(), "media")  # where we store all chunks + metadata
 RETRY_INTERVAL = 3           # seconds to wait before retrying camera open
 
 # HLS settings: single bitrate (you can adjust bitrate as needed)
@@ -23,27 +24,105 @@ HLS_BITRATE = "2000k"
 HLS_HEIGHT = 720   # we'll scale to 720p
 FRAME_SIZE = (1280, 720)  # placeholder; replaced by actual camera resolution
 
+# === Adaptive quality (per-camera overload control) ===
+ADAPTIVE_QUALITY = True      # set False (or pass --no-adapt) to pin full quality
+CONTROL_INTERVAL = 2.0       # seconds between controller checks
+QUEUE_HIGH = 0.8             # queue fill ratio treated as overload
+QUEUE_LOW = 0.2              # queue fill ratio treated as headroom
+MAX_FRAME_AGE = 1.5          # seconds from capture to encoder before a camera counts as lagging
+DEGRADE_AFTER = 2            # consecutive overloaded checks before stepping quality down
+RECOVER_AFTER = 10           # consecutive healthy checks before stepping quality back up
+
+# Quality ladders per knob; level 0 is full quality.
+QUALITY_LADDERS = {
+    "inference": [1, 2, 3, 5],                        # run the detector on every Nth frame
+    "fps": [FPS, 20, 15, 10],                         # capture + encode frame rate
+    "resolution": [(HLS_HEIGHT, HLS_BITRATE), (540, "1200k"), (360, "700k")],
+    "preset": ["veryfast", "superfast", "ultrafast"],  # x264 preset
+}
+# Order in which knobs are stepped down under overload; recovery runs in reverse.
+DEGRADE_ORDER = ["inference", "fps", "resolution", "preset"]
+# Knobs that only take effect after restarting FFmpeg.
+ENCODER_KNOBS = {"fps", "resolution", "preset"}
+
 # === Helpers ===
 
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path, exist_ok=True)
 
-def get_output_dir(camera_id):
+def get_day(ts):
+    """
+    Returns the YYYY-MM-DD folder name for a UNIX timestamp.
     """
-    Returns: <MEDIA_ROOT>/<YYYY-MM-DD>/<camera_id>/
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+def get_output_dir(camera_id, day=None):
     """
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    out_dir = os.path.join(MEDIA_ROOT, today, camera_id)
+    Returns: <storage root>/<YYYY-MM-DD>/<camera_id>/  (day defaults to today)
+    The storage root is picked per camera from settings.MEDIA_ROOTS; a day
+    already started on another root stays there so it is never split.
+    """
+    day = day or get_day(time.time())
+    out_dir = (find_camera_folder(day, camera_id)
+               or os.path.join(get_camera_root(camera_id), day, camera_id))
     ensure_dir(out_dir)
     return out_dir
 
+def load_json(path, default):
+    """
+    Returns the parsed contents of path, or default if it is missing or unreadable.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+def write_json(path, data, **kwargs):
+    """
+    Write JSON via a temp file + os.replace so API readers never see a half-written file.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+def count_playlist_segments(playlist_path):
+    """
+    Number of segments listed in an HLS playlist. With append_list FFmpeg
+    continues numbering from here, so this is the number of its next segment.
+    """
+    try:
+        with open(playlist_path, "r") as f:
+            return sum(1 for line in f if line.strip().endswith(".ts"))
+    except FileNotFoundError:
+        return 0
+
+def new_camera_state():
+    """
+    Shared per-camera state: current ladder level per knob plus the lag
+    signals the stages report back to the controller.
+    """
+    return {
+        "levels": {knob: 0 for knob in QUALITY_LADDERS},
+        "frame_age": 0.0,          # seconds between capture and FFmpeg write (latest frame)
+        "frame_age_at": 0.0,       # when frame_age was last updated
+        "encoder_restart": False,  # set when an encoder knob changes
+    }
+
+def quality(state, knob):
+    """
+    Returns the current setting for knob, e.g. quality(state, "fps") -> 20.
+    """
+    return QUALITY_LADDERS[knob][state["levels"][knob]]
+
 # === Pipeline Stages ===
 
-def capture_frames(cam_index, frame_q):
+def capture_frames(cam_index, frame_q, state):
     """
-    Continuously capture frames from cam_index; put each frame into frame_q.
-    If camera fails, retry after RETRY_INTERVAL.
+    Continuously capture frames from cam_index; put (frame, capture_ts) into frame_q
+    at the camera's current FPS level. If camera fails, retry after RETRY_INTERVAL.
     """
     while True:
         cap = cv2.VideoCapture(cam_index)
@@ -59,8 +138,8 @@ def capture_frames(cam_index, frame_q):
                 print(f"[WARN] Camera {cam_index} capture failed; reopening.")
                 break
 
-            frame_q.put(frame)
-            time.sleep(1.0 / FPS)
+            frame_q.put((frame, time.time()))
+            time.sleep(1.0 / quality(state, "fps"))
 
         cap.release()
         time.sleep(RETRY_INTERVAL)
@@ -70,18 +149,25 @@ def capture_frames(cam_index, frame_q):
 
 FAKE_LABELS = ["person", "car", "bottle", "cat", "dog", "chair", "tree", "phone", "laptop", "book"]
 
-def model_inference(frame_q, annotated_q):
+def model_inference(frame_q, annotated_q, state):
     """
     Simulates model inference by generating random detections (1-3 per frame).
+    Under overload only every Nth frame is run through the detector; the
+    others pass through with no detections.
     """
+    frame_count = 0
     while True:
         try:
-            frame = frame_q.get(timeout=1)
+            frame, ts = frame_q.get(timeout=1)
         except queue.Empty:
             time.sleep(0.1)
             continue
 
-        ts = time.time()
+        frame_count += 1
+        if frame_count % quality(state, "inference"):
+            annotated_q.put((frame, [], ts))
+            continue
+
         height, width, _ = frame.shape
 
         num_detections = random.randint(1, 3)
@@ -109,44 +195,104 @@ def model_inference(frame_q, annotated_q):
         annotated_q.put((frame, metadata, ts))
 
 
-def stream_with_ffmpeg(camera_id, annotated_q):
+def build_ffmpeg_cmd(out_dir, state, restart=False):
     """
-    Read (frame, metadata, ts) from annotated_q; pipe frames into FFmpeg to generate HLS chunks
-    (no deletions) and write one JSON metadata file per chunk.
+    FFmpeg command for a single HLS bitrate, no sliding-window deletions,
+    using the camera's current fps / resolution / preset levels.
     """
-    out_dir = get_output_dir(camera_id)
     # HLS segment pattern and playlist
     segment_pattern = os.path.join(out_dir, "segment_%05d.ts")
     playlist_path = os.path.join(out_dir, "index.m3u8")
 
-    # Build FFmpeg command for a single HLS bitrate, no sliding-window deletions
-    cmd = [
+    fps = quality(state, "fps")
+    height, bitrate = quality(state, "resolution")
+    hls_flags = "append_list+independent_segments"
+    if restart:
+        # Appending to an existing playlist: tell players the stream was cut
+        hls_flags += "+discont_start"
+
+    return [
         "ffmpeg",
         "-y",
         "-f", "rawvideo",
         "-pixel_format", "bgr24",
         "-video_size", f"{FRAME_SIZE[0]}x{FRAME_SIZE[1]}",
-        "-framerate", str(FPS),
+        "-framerate", str(fps),
         "-i", "pipe:0",
-        "-filter:v", f"scale=-2:{HLS_HEIGHT}",
+        "-filter:v", f"scale=-2:{height}",
         "-c:v", "libx264",
-        "-preset", "veryfast",
-        "-b:v", HLS_BITRATE,
-        "-g", str(FPS * SEGMENT_DURATION),
+        "-preset", quality(state, "preset"),
+        "-b:v", bitrate,
+        "-g", str(fps * SEGMENT_DURATION),
         "-sc_threshold", "0",
         "-f", "hls",
         "-hls_time", str(SEGMENT_DURATION),
         "-hls_list_size", "0",                      # keep all segments indefinitely
-        "-hls_flags", "append_list+independent_segments",
+        "-hls_flags", hls_flags,
         "-hls_segment_filename", segment_pattern,
         playlist_path
     ]
 
-    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-    segment_buffer = []
-    segment_start_ts = time.time()
-    segment_index = 0
-    metadata_index = []
+def start_encoder(out_dir, state, restart=False):
+    """
+    Launch FFmpeg for the camera's current quality levels.
+    """
+    return subprocess.Popen(build_ffmpeg_cmd(out_dir, state, restart), stdin=subprocess.PIPE)
+
+def stop_encoder(proc):
+    """
+    Close FFmpeg's stdin so it flushes its last segment, then wait for it.
+    """
+    try:
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass  # FFmpeg already exited
+    proc.wait()
+
+def chunk_duration(start_ts, last_ts, frames, fps):
+    """
+    Wall-clock span of a chunk: first frame to the end of the last frame's
+    interval, using the measured frame interval (capture is always a bit
+    slower than the nominal 1/fps) so back-to-back chunks don't leave gaps.
+    """
+    if frames < 2:
+        return 1.0 / fps
+    return (last_ts - start_ts) * frames / (frames - 1)
+
+def write_chunk(out_dir, segment_index, metadata, start_ts, duration, media_duration,
+                metadata_index, seek_index):
+    """
+    Write segment_<n>.json for one chunk and append it to both indexes.
+    """
+    json_path = os.path.join(out_dir, f"segment_{segment_index:05d}.json")
+    write_json(json_path, metadata)
+
+    metadata_index.append({
+        "segment": segment_index,
+        "metadata_file": os.path.basename(json_path),
+        "start_ts": start_ts,
+        "duration": duration
+    })
+    seek_index.append([segment_index, round(start_ts, 3), round(duration, 3), round(media_duration, 3)])
+
+    # Update master metadata index
+    write_json(os.path.join(out_dir, "metadata_index.json"), metadata_index)
+    # Update seek index (wall-clock -> segment)
+    write_json(os.path.join(out_dir, SEEK_INDEX_FILE), seek_index, separators=(",", ":"))
+
+def stream_with_ffmpeg(camera_id, annotated_q, state):
+    """
+    Read (frame, metadata, ts) from annotated_q; pipe frames into FFmpeg to generate HLS chunks
+    (no deletions) and write one JSON metadata file per chunk.
+
+    Chunks are cut on frame count (fps * SEGMENT_DURATION, the same GOP FFmpeg
+    cuts on) and numbered from FFmpeg's playlist, so segment_<n>.json always
+    matches segment_<n>.ts. FFmpeg is restarted (appending to the same
+    playlist) when the controller changes an encoder knob, and moved to a new
+    day folder at midnight.
+    """
+    proc = None
+    day = None
 
     while True:
         try:
@@ -155,6 +301,41 @@ def stream_with_ffmpeg(camera_id, annotated_q):
             time.sleep(0.1)
             continue
 
+        now = time.time()
+        state["frame_age"] = now - ts
+        state["frame_age_at"] = now
+
+        frame_day = get_day(ts)
+        if proc is None or frame_day != day or state["encoder_restart"]:
+            if proc is not None:
+                # FFmpeg flushes its partial segment on exit; close ours to match
+                if chunk_frames:
+                    write_chunk(out_dir, segment_index, segment_buffer, segment_start_ts,
+                                chunk_duration(segment_start_ts, last_ts, chunk_frames, fps), chunk_frames / fps,
+                                metadata_index, seek_index)
+                stop_encoder(proc)
+
+            if frame_day != day:
+                day = frame_day
+                out_dir = get_output_dir(camera_id, day)
+                metadata_index = load_json(os.path.join(out_dir, "metadata_index.json"), [])
+                seek_index = load_json(os.path.join(out_dir, SEEK_INDEX_FILE), [])
+
+            state["encoder_restart"] = False
+            playlist_path = os.path.join(out_dir, "index.m3u8")
+            segment_index = count_playlist_segments(playlist_path)
+            # Drop rows for segments FFmpeg is about to overwrite (e.g. an
+            # unlisted partial segment from a killed run)
+            metadata_index = [m for m in metadata_index if m["segment"] < segment_index]
+            seek_index = [row for row in seek_index if row[0] < segment_index]
+
+            fps = quality(state, "fps")
+            frames_per_segment = fps * SEGMENT_DURATION
+            proc = start_encoder(out_dir, state, restart=os.path.exists(playlist_path))
+            segment_buffer = []
+            segment_start_ts = None
+            chunk_frames = 0
+
         # Feed raw frame data into FFmpeg stdin
         try:
             proc.stdin.write(frame.tobytes())
@@ -162,26 +343,99 @@ def stream_with_ffmpeg(camera_id, annotated_q):
             print(f"[ERROR] FFmpeg pipe broken for {camera_id}; exiting stream thread.")
             break
 
+        # Start the chunk clock on its first frame so camera reconnect gaps
+        # don't skew start times
+        if segment_start_ts is None:
+            segment_start_ts = ts
         segment_buffer.extend(metadata)
-        now = time.time()
-        if now - segment_start_ts >= SEGMENT_DURATION:
-            # Write metadata JSON for this chunk
-            json_path = os.path.join(out_dir, f"segment_{segment_index:05d}.json")
-            with open(json_path, "w") as f_json:
-                json.dump(segment_buffer, f_json)
-
-            metadata_index.append({
-                "segment": segment_index,
-                "metadata_file": os.path.basename(json_path)
-            })
+        chunk_frames += 1
+        last_ts = ts
+
+        if chunk_frames >= frames_per_segment:
+            write_chunk(out_dir, segment_index, segment_buffer, segment_start_ts,
+                        chunk_duration(segment_start_ts, last_ts, chunk_frames, fps), chunk_frames / fps,
+                        metadata_index, seek_index)
             segment_buffer = []
             segment_index += 1
-            segment_start_ts = now
+            segment_start_ts = None
+            chunk_frames = 0
+
+
+def step_quality(camera_id, state, degrade):
+    """
+    Move one knob one level: under overload, the first knob in DEGRADE_ORDER
+    that can still go down; on recovery, the last degraded knob goes back up.
+    Returns the knob changed, or None if already at the end of every ladder.
+    """
+    order = DEGRADE_ORDER if degrade else list(reversed(DEGRADE_ORDER))
+    for knob in order:
+        level = state["levels"][knob]
+        if degrade and level + 1 < len(QUALITY_LADDERS[knob]):
+            state["levels"][knob] = level + 1
+        elif not degrade and level > 0:
+            state["levels"][knob] = level - 1
+        else:
+            continue
+
+        if knob in ENCODER_KNOBS:
+            state["encoder_restart"] = True
+        action = "degraded" if degrade else "recovered"
+        print(f"[ADAPT] {camera_id}: {action} {knob} -> {quality(state, knob)}")
+        return knob
+    return None
 
-            # Update master metadata index
-            index_path = os.path.join(out_dir, "metadata_index.json")
-            with open(index_path, "w") as f_index:
-                json.dump(metadata_index, f_index)
+def check_load(state, frame_q, annotated_q, prev_backlog):
+    """
+    Classify one controller check as "overloaded", "healthy" or None (neither).
+
+    Encoder lag shows up as annotated_q growing between checks; inference lag
+    as frame_q filling; either shows up end to end as frame_age. frame_age is
+    ignored once no frame has reached the encoder for a CONTROL_INTERVAL, so a
+    camera outage holds the current levels instead of walking them down.
+    """
+    fill = max(frame_q.qsize() / frame_q.maxsize,
+               annotated_q.qsize() / annotated_q.maxsize)
+    backlog = annotated_q.qsize()
+    encoder_lagging = backlog > prev_backlog and backlog >= QUEUE_LOW * annotated_q.maxsize
+    flowing = time.time() - state["frame_age_at"] <= CONTROL_INTERVAL
+    age = state["frame_age"] if flowing else 0.0
+
+    if fill >= QUEUE_HIGH or encoder_lagging or age > MAX_FRAME_AGE:
+        return "overloaded"
+    if flowing and fill <= QUEUE_LOW and age <= MAX_FRAME_AGE / 2:
+        return "healthy"
+    return None
+
+def adapt_quality(camera_id, state, frame_q, annotated_q):
+    """
+    Per-camera controller: every CONTROL_INTERVAL, check queue depth, encoder
+    backlog and frame age; step quality down after DEGRADE_AFTER overloaded
+    checks and back up after RECOVER_AFTER healthy ones.
+    """
+    overloaded_checks = 0
+    healthy_checks = 0
+    prev_backlog = 0
+    while True:
+        time.sleep(CONTROL_INTERVAL)
+
+        load = check_load(state, frame_q, annotated_q, prev_backlog)
+        prev_backlog = annotated_q.qsize()
+
+        if load == "overloaded":
+            overloaded_checks += 1
+            healthy_checks = 0
+        elif load == "healthy":
+            healthy_checks += 1
+            overloaded_checks = 0
+        else:
+            overloaded_checks = healthy_checks = 0
+
+        if overloaded_checks >= DEGRADE_AFTER:
+            step_quality(camera_id, state, degrade=True)
+            overloaded_checks = 0
+        elif healthy_checks >= RECOVER_AFTER:
+            step_quality(camera_id, state, degrade=False)
+            healthy_checks = 0
 
 
 def start_pipeline_for_camera(cam_index):
@@ -190,10 +444,12 @@ def start_pipeline_for_camera(cam_index):
       - capture_frames → frame_q
       - model_inference → annotated_q
       - stream_with_ffmpeg → HLS + JSON chunks
+      - adapt_quality (if ADAPTIVE_QUALITY) → per-camera overload control
     """
     camera_id = f"cam{cam_index}"
     frame_q = queue.Queue(maxsize=50)
     annotated_q = queue.Queue(maxsize=50)
+    state = new_camera_state()
 
     # Detect actual camera resolution once
     cap_test = cv2.VideoCapture(cam_index)
@@ -206,14 +462,19 @@ def start_pipeline_for_camera(cam_index):
             FRAME_SIZE = (w, h)
             print(f"[INFO] Camera {cam_index} resolution set to {FRAME_SIZE}")
 
-    t_capture = threading.Thread(target=capture_frames, args=(cam_index, frame_q), daemon=True)
-    t_infer   = threading.Thread(target=model_inference, args=(frame_q, annotated_q), daemon=True)
-    t_stream  = threading.Thread(target=stream_with_ffmpeg, args=(camera_id, annotated_q), daemon=True)
+    t_capture = threading.Thread(target=capture_frames, args=(cam_index, frame_q, state), daemon=True)
+    t_infer   = threading.Thread(target=model_inference, args=(frame_q, annotated_q, state), daemon=True)
+    t_stream  = threading.Thread(target=stream_with_ffmpeg, args=(camera_id, annotated_q, state), daemon=True)
+    threads = [t_capture, t_infer, t_stream]
 
-    for t in (t_capture, t_infer, t_stream):
+    if ADAPTIVE_QUALITY:
+        t_adapt = threading.Thread(target=adapt_quality, args=(camera_id, state, frame_q, annotated_q), daemon=True)
+        threads.append(t_adapt)
+
+    for t in threads:
         t.start()
 
-    return [t_capture, t_infer, t_stream]
+    return threads
 
 
 # === Django Management Command ===
@@ -228,9 +489,24 @@ class Command(BaseCommand):
             default=[0],
             help="Camera indices, e.g. --cameras 0 1 2"
         )
+        parser.add_argument(
+            '--no-adapt',
+            action='store_true',
+            help="Disable adaptive quality; always run at full quality."
+        )
+        parser.add_argument(
+            '--degrade-order',
+            nargs='+',
+            choices=list(QUALITY_LADDERS),
+            default=DEGRADE_ORDER,
+            help="Knobs to step down under overload, in order, e.g. --degrade-order preset inference"
+        )
 
     def handle(self, *args, **options):
+        global ADAPTIVE_QUALITY, DEGRADE_ORDER
         camera_indices = options['cameras']
+        ADAPTIVE_QUALITY = not options['no_adapt']
+        DEGRADE_ORDER = options['degrade_order']
         all_threads = []
 
         for cam_idx in camera_indices:
@@ -245,20 +521,3 @@ class Command(BaseCommand):
                 time.sleep(1)
         except KeyboardInterrupt:
             print("[INFO] Shutting down camera pipelines...")
-
-# === Standalone Execution ===
-if __name__ == '__main__':
-    camera_sources = [0,1]  # change indices or add RTSP URLs as needed
-    all_threads = []
-    for cam_idx in camera_sources:
-        print(f"[INFO] Starting pipeline for camera index {cam_idx}")
-        th = threading.Thread(target=start_pipeline_for_camera, args=(cam_idx,), daemon=True)
-        th.start()
-        all_threads.append(th)
-
-    print("[INFO] Pipelines running. Press Ctrl+C to stop.")
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("[INFO] Exiting.")
@@ -4,6 +4,73 @@ import signal
 import time
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from streams.storage import get_media_roots
+
+CORS_HEADERS = """\
+            add_header Access-Control-Allow-Origin * always;
+            add_header Access-Control-Allow-Methods 'GET, OPTIONS' always;
+            add_header Access-Control-Allow-Headers * always;
+"""
+
+NGINX_CONF_TEMPLATE = """\
+worker_processes  1;
+
+events {{
+    worker_connections  1024;
+}}
+
+http {{
+    include       mime.types;
+    default_type  application/octet-stream;
+
+    sendfile        on;
+    keepalive_timeout  65;
+
+    server {{
+        listen       {listen};
+        server_name  _;
+
+        # ✅ Serve your HLS media files directly (tried across every storage root)
+{media_locations}
+        # ✅ Proxy all other requests to Django backend
+        location / {{
+            proxy_pass         http://127.0.0.1:8000;
+            proxy_set_header   Host $host;
+            proxy_set_header   X-Real-IP $remote_addr;
+            proxy_set_header   X-Forwarded-For $proxy_add_x_forwarded_for;
+        }}
+    }}
+}}
+"""
+
+def render_media_locations(media_url, roots):
+    """
+    Builds the /media/ location chain: each storage root gets a location that
+    tries the file and falls through to the next root, the last one 404s.
+    """
+    roots = [os.path.abspath(r).replace('\\', '/').rstrip('/').replace('"', '\\"') for r in roots]
+    blocks = []
+    for i, root in enumerate(roots):
+        name = f"~ ^{media_url}(?<media_path>.+)$" if i == 0 else f"@media_{i}"
+        fallback = f"@media_{i + 1}" if i + 1 < len(roots) else "=404"
+        blocks.append(
+            f"        location {name} {{\n"
+            f"            root  \"{root}\";\n"
+            f"            try_files /$media_path {fallback};\n"
+            f"            autoindex off;\n\n"
+            f"{CORS_HEADERS}"
+            f"        }}\n"
+        )
+    return "\n".join(blocks)
+
+def render_nginx_conf():
+    """
+    Renders nginx.conf from settings (NGINX_LISTEN, MEDIA_URL, MEDIA_ROOTS).
+    """
+    return NGINX_CONF_TEMPLATE.format(
+        listen=getattr(settings, 'NGINX_LISTEN', '127.0.0.1:80'),
+        media_locations=render_media_locations(settings.MEDIA_URL, get_media_roots()),
+    )
 
 class Command(BaseCommand):
     help = 'Start or reload the Nginx server (from BASE_DIR/nginx). Press Ctrl+C to stop Nginx.'
@@ -14,11 +81,22 @@ class Command(BaseCommand):
             action='store_true',
             help='Reload Nginx instead of starting it fresh.',
         )
+        parser.add_argument(
+            '--write-config',
+            action='store_true',
+            help='Regenerate nginx/conf/nginx.conf from MEDIA_ROOTS before starting/reloading.',
+        )
 
     def handle(self, *args, **options):
         nginx_dir = os.path.join(settings.BASE_DIR, 'nginx')
         nginx_exe = os.path.join(nginx_dir, 'nginx.exe')
 
+        if options['write_config']:
+            conf_path = os.path.join(nginx_dir, 'conf', 'nginx.conf')
+            with open(conf_path, 'w', encoding='utf-8') as f:
+                f.write(render_nginx_conf())
+            self.stdout.write(self.style.SUCCESS(f"[Nginx] Wrote config for {len(get_media_roots())} media root(s) to {conf_path}"))
+
         if not os.path.exists(nginx_exe):
             self.stderr.write(self.style.ERROR(f"[ERROR] nginx.exe not found at: {nginx_exe}"))
             return
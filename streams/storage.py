@@ -0,0 +1,60 @@
+# streams/storage.py
+
+import os
+import zlib
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# === Storage roots / camera placement ===
+
+def get_media_roots():
+    """
+    Returns the list of storage roots segments may live under.
+    Uses settings.MEDIA_ROOTS, falling back to [settings.MEDIA_ROOT].
+    """
+    return list(getattr(settings, 'MEDIA_ROOTS', None) or [settings.MEDIA_ROOT])
+
+def validate_storage_config():
+    """
+    Raises ImproperlyConfigured if CAMERA_STORAGE_MAP points outside MEDIA_ROOTS.
+    """
+    roots = get_media_roots()
+    for camera_id, index in getattr(settings, 'CAMERA_STORAGE_MAP', {}).items():
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(roots):
+            raise ImproperlyConfigured(
+                f"CAMERA_STORAGE_MAP['{camera_id}'] = {index!r} is not an index into "
+                f"MEDIA_ROOTS (0..{len(roots) - 1})."
+            )
+
+def get_camera_root(camera_id):
+    """
+    Returns the storage root a camera writes to.
+    Explicit placement in settings.CAMERA_STORAGE_MAP (camera_id -> index into
+    MEDIA_ROOTS) wins; other cameras go to the root with the highest
+    hash(camera_id, root) (rendezvous hashing), so adding a root only moves
+    the cameras that land on the new one.
+    """
+    roots = get_media_roots()
+    mapping = getattr(settings, 'CAMERA_STORAGE_MAP', {})
+    if camera_id in mapping:
+        return roots[mapping[camera_id]]
+    # crc32 rather than hash(): str hashes are salted per process.
+    return max(roots, key=lambda root: zlib.crc32(f"{camera_id}|{root}".encode()))
+
+def find_camera_folder(date_str, camera_id):
+    """
+    Returns <root>/<date_str>/<camera_id> on whichever root holds it, checking
+    the camera's current placement first, or None if no root has it.
+
+    The pipeline keeps writing a day to the folder it started in, so a
+    placement change (new root, edited map) only takes effect the next day
+    and a day lives on one root. If a day does end up on two roots (e.g. files
+    copied by hand), the current placement's folder wins.
+    """
+    home = get_camera_root(camera_id)
+    roots = [home] + [r for r in get_media_roots() if r != home]
+    for root in roots:
+        folder = os.path.join(root, date_str, camera_id)
+        if os.path.isdir(folder):
+            return folder
+    return None
@@ -1,3 +1,286 @@
-from django.test import TestCase
+import os
+import json
+import time
+import queue
+import shutil
+import tempfile
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .constants import SEEK_INDEX_FILE
+from .views import load_seek_index
+from .storage import get_camera_root, find_camera_folder, validate_storage_config
+from .management.commands import ml_pipeline
+from .management.commands.nginx_server import render_media_locations
+
+
+class MediaRootsTestCase(TestCase):
+    """
+    Gives each test two empty storage roots; tests opt into them with
+    override_settings(MEDIA_ROOTS=...).
+    """
+
+    def setUp(self):
+        self.roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        for root in self.roots:
+            self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+
+    def make_camera_folder(self, root, date_str, camera_id):
+        folder = os.path.join(root, date_str, camera_id)
+        os.makedirs(folder)
+        return folder
+
+
+class SeekSegmentTests(MediaRootsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(MEDIA_ROOTS=self.roots[:1], CAMERA_STORAGE_MAP={})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.folder = self.make_camera_folder(self.roots[0], "2025-06-05", "cam0")
+        # Two 2s chunks (the first ending just short of the second's start),
+        # then a camera outage from t=1004 to t=1010
+        self.write_index([[0, 1000.0, 1.96, 2.0], [1, 1002.0, 2.0, 2.0], [2, 1010.0, 4.0, 2.0]])
+
+    def write_index(self, rows):
+        load_seek_index.cache_clear()
+        with open(os.path.join(self.folder, SEEK_INDEX_FILE), "w") as f:
+            json.dump(rows, f)
+
+    def seek(self, t):
+        url = reverse('seek_segment', args=["2025-06-05", "cam0"])
+        return self.client.get(url, {"t": t})
+
+    def test_hit(self):
+        response = self.seek("1003.5")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["segment"], 1)
+        self.assertEqual(data["offset"], 1.5)
+        self.assertEqual(data["segment_file"], "segment_00001.ts")
+        self.assertEqual(data["metadata_file"], "segment_00001.json")
+
+    def test_offset_is_scaled_to_playback_time(self):
+        # 4s of wall-clock captured into a 2s segment
+        data = self.seek("1012").json()
+        self.assertEqual(data["segment"], 2)
+        self.assertEqual(data["offset"], 1.0)
+
+    def test_small_gap_between_rows_belongs_to_earlier_row(self):
+        response = self.seek("1001.98")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["segment"], 0)
+        self.assertEqual(response.json()["offset"], 2.0)
+
+    def test_after_last_row(self):
+        self.assertEqual(self.seek("1014.5").status_code, 404)
+
+    def test_bad_row_shape_is_unavailable(self):
+        for index in ([[0, 1000.0, 2.0]], {"0": [0, 1000.0, 2.0, 2.0]}, [[0, "1000", 2.0, 2.0]]):
+            self.write_index(index)
+            self.assertEqual(self.seek("1000.5").status_code, 503, index)
+
+    def test_gap(self):
+        self.assertEqual(self.seek("1006").status_code, 404)
+
+    def test_before_first_row(self):
+        self.assertEqual(self.seek("999.9").status_code, 404)
+
+    def test_bad_t(self):
+        url = reverse('seek_segment', args=["2025-06-05", "cam0"])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        for t in ("abc", "nan", "inf"):
+            self.assertEqual(self.seek(t).status_code, 400, t)
+
+
+class StoragePlacementTests(MediaRootsTestCase):
+
+    def test_explicit_mapping_wins(self):
+        with override_settings(MEDIA_ROOTS=self.roots, CAMERA_STORAGE_MAP={'cam0': 1, 'cam1': 0}):
+            self.assertEqual(get_camera_root('cam0'), self.roots[1])
+            self.assertEqual(get_camera_root('cam1'), self.roots[0])
+
+    def test_hash_placement_is_stable_and_uses_every_root(self):
+        with override_settings(MEDIA_ROOTS=self.roots, CAMERA_STORAGE_MAP={}):
+            placed = {cam: get_camera_root(cam) for cam in (f"cam{i}" for i in range(16))}
+            self.assertEqual(placed, {cam: get_camera_root(cam) for cam in placed})
+            self.assertEqual(set(placed.values()), set(self.roots))
+
+    def test_adding_a_root_only_moves_cameras_onto_it(self):
+        cams = [f"cam{i}" for i in range(32)]
+        with override_settings(MEDIA_ROOTS=self.roots, CAMERA_STORAGE_MAP={}):
+            before = {cam: get_camera_root(cam) for cam in cams}
+        new_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, new_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOTS=self.roots + [new_root], CAMERA_STORAGE_MAP={}):
+            for cam in cams:
+                self.assertIn(get_camera_root(cam), (before[cam], new_root))
+
+    def test_falls_back_to_media_root(self):
+        with override_settings(MEDIA_ROOT=self.roots[0], MEDIA_ROOTS=None, CAMERA_STORAGE_MAP={}):
+            self.assertEqual(get_camera_root('cam0'), self.roots[0])
+
+    def test_invalid_mapping_is_rejected(self):
+        for index in (2, -1, '1', None):
+            with override_settings(MEDIA_ROOTS=self.roots, CAMERA_STORAGE_MAP={'cam0': index}):
+                with self.assertRaises(ImproperlyConfigured):
+                    validate_storage_config()
+
+    def test_find_camera_folder(self):
+        with override_settings(MEDIA_ROOTS=self.roots, CAMERA_STORAGE_MAP={'cam0': 0}):
+            self.assertIsNone(find_camera_folder("2025-06-05", "cam0"))
+
+            # Found on a root other than its placement
+            other = self.make_camera_folder(self.roots[1], "2025-06-05", "cam0")
+            self.assertEqual(find_camera_folder("2025-06-05", "cam0"), other)
+
+            # Placement root wins when a day exists on both
+            home = self.make_camera_folder(self.roots[0], "2025-06-05", "cam0")
+            self.assertEqual(find_camera_folder("2025-06-05", "cam0"), home)
+
+
+class MergedListingTests(MediaRootsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(MEDIA_ROOTS=self.roots, CAMERA_STORAGE_MAP={})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.make_camera_folder(self.roots[0], "2025-06-04", "cam0")
+        self.make_camera_folder(self.roots[0], "2025-06-05", "cam0")
+        self.make_camera_folder(self.roots[1], "2025-06-05", "cam1")
+        self.make_camera_folder(self.roots[1], "2025-06-06", "cam2")
+        os.makedirs(os.path.join(self.roots[1], "not-a-date", "cam9"))
+        os.makedirs(os.path.join(self.roots[1], "2025-06-07"))  # no cameras yet
+
+    def test_list_dates(self):
+        response = self.client.get(reverse('list_dates'))
+        self.assertEqual(response.json(), {
+            "dates": ["2025-06-07", "2025-06-06", "2025-06-05", "2025-06-04"]
+        })
+
+    def test_list_cameras_for_date(self):
+        response = self.client.get(reverse('list_cameras', args=["2025-06-05"]))
+        self.assertEqual(response.json(), {"cameras": ["cam0", "cam1"]})
+        self.assertEqual(self.client.get(reverse('list_cameras', args=["2025-01-01"])).status_code, 404)
+
+    def test_all_streams_manifest(self):
+        response = self.client.get(reverse('all_streams_manifest'))
+        self.assertEqual(response.json(), {"dates": {
+            "2025-06-04": ["cam0"],
+            "2025-06-05": ["cam0", "cam1"],
+            "2025-06-06": ["cam2"],
+        }})
+
+
+class RenderMediaLocationsTests(TestCase):
+
+    def test_single_root(self):
+        conf = render_media_locations('/media/', ['/srv/media/'])
+        self.assertIn('location ~ ^/media/(?<media_path>.+)$ {', conf)
+        self.assertIn('root  "/srv/media";', conf)
+        self.assertIn('try_files /$media_path =404;', conf)
+        self.assertNotIn('@media_1', conf)
+
+    def test_roots_are_chained_and_quoted(self):
+        conf = render_media_locations('/media/', ['/disk0/media', '/disk 1/media'])
+        self.assertIn('try_files /$media_path @media_1;', conf)
+        self.assertIn('location @media_1 {', conf)
+        self.assertIn('root  "/disk 1/media";', conf)
+        self.assertEqual(conf.count('=404'), 1)
+        self.assertEqual(conf.count('add_header Access-Control-Allow-Origin'), 2)
+
+
+class ChunkDurationTests(TestCase):
+
+    def test_uses_measured_frame_interval(self):
+        # 30 frames at 15 fps real rate, declared 30 fps
+        self.assertAlmostEqual(ml_pipeline.chunk_duration(1000.0, 1000.0 + 29 / 15, 30, 30), 2.0)
+
+    def test_single_frame_uses_nominal_interval(self):
+        self.assertAlmostEqual(ml_pipeline.chunk_duration(1000.0, 1000.0, 1, 20), 0.05)
+
+
+class StepQualityTests(TestCase):
+
+    def setUp(self):
+        self.state = ml_pipeline.new_camera_state()
+        print_patch = mock.patch('builtins.print')
+        print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def step(self, degrade):
+        return ml_pipeline.step_quality('cam0', self.state, degrade)
+
+    def test_degrade_follows_order_then_recovers_in_reverse(self):
+        steps = sum(len(ladder) - 1 for ladder in ml_pipeline.QUALITY_LADDERS.values())
+        degraded = [self.step(True) for _ in range(steps)]
+        expected = [knob for knob in ml_pipeline.DEGRADE_ORDER
+                    for _ in range(len(ml_pipeline.QUALITY_LADDERS[knob]) - 1)]
+        self.assertEqual(degraded, expected)
+        self.assertIsNone(self.step(True))
+
+        recovered = [self.step(False) for _ in range(steps)]
+        self.assertEqual(recovered, list(reversed(expected)))
+        self.assertIsNone(self.step(False))
+        self.assertEqual(set(self.state["levels"].values()), {0})
+
+    def test_only_encoder_knobs_request_restart(self):
+        self.assertEqual(self.step(True), "inference")
+        self.assertFalse(self.state["encoder_restart"])
+
+        self.state["levels"]["inference"] = len(ml_pipeline.QUALITY_LADDERS["inference"]) - 1
+        self.assertEqual(self.step(True), "fps")
+        self.assertTrue(self.state["encoder_restart"])
+        self.assertEqual(ml_pipeline.quality(self.state, "fps"), ml_pipeline.QUALITY_LADDERS["fps"][1])
+
+
+class CheckLoadTests(TestCase):
+
+    def setUp(self):
+        self.state = ml_pipeline.new_camera_state()
+        self.frame_q = queue.Queue(maxsize=10)
+        self.annotated_q = queue.Queue(maxsize=10)
+
+    def check(self, prev_backlog=0):
+        return ml_pipeline.check_load(self.state, self.frame_q, self.annotated_q, prev_backlog)
+
+    def frames_flowing(self, age):
+        self.state["frame_age"] = age
+        self.state["frame_age_at"] = time.time()
+
+    def test_idle_and_flowing_is_healthy(self):
+        self.frames_flowing(0.05)
+        self.assertEqual(self.check(), "healthy")
+
+    def test_single_waiting_frame_is_not_overload(self):
+        self.frames_flowing(0.05)
+        self.annotated_q.put(None)
+        self.assertEqual(self.check(), "healthy")
+
+    def test_full_queue_or_old_frames_are_overload(self):
+        self.frames_flowing(0.05)
+        for _ in range(8):
+            self.frame_q.put(None)
+        self.assertEqual(self.check(), "overloaded")
+
+        self.frame_q = queue.Queue(maxsize=10)
+        self.frames_flowing(ml_pipeline.MAX_FRAME_AGE + 1)
+        self.assertEqual(self.check(), "overloaded")
+
+    def test_growing_encoder_backlog_is_overload(self):
+        self.frames_flowing(0.05)
+        for _ in range(3):
+            self.annotated_q.put(None)
+        self.assertEqual(self.check(prev_backlog=1), "overloaded")
+        self.assertIsNone(self.check(prev_backlog=3))
+
+    def test_stale_frame_age_holds_levels_during_outage(self):
+        self.state["frame_age"] = ml_pipeline.MAX_FRAME_AGE + 5
+        self.state["frame_age_at"] = time.time() - 10 * ml_pipeline.CONTROL_INTERVAL
+        self.assertIsNone(self.check())
@@ -31,4 +31,11 @@ urlpatterns = [
 
     # 6) Full manifest of all dates/cameras
     path('api/streams/manifest/', views.all_streams_manifest, name='all_streams_manifest'),
+
+    # 7) Map a wall-clock timestamp to segment + offset
+    path(
+        'api/streams/<str:date_str>/<str:camera_id>/seek/',
+        views.seek_segment,
+        name='seek_segment'
+    ),
 ]
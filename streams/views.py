@@ -2,49 +2,62 @@
 
 import os
 import json
+import math
+import bisect
 import datetime
+from functools import lru_cache
 from django.conf import settings
 from django.http import JsonResponse, Http404, HttpResponseRedirect
 from django.urls import reverse
 from django.views.decorators.http import require_GET
+from django.views.static import serve
+
+from .constants import SEEK_INDEX_FILE, SEEK_MAX_GAP
+from .storage import get_media_roots, find_camera_folder
 
 # === Helper to build absolute filesystem paths ===
 def get_camera_folder(date_str, camera_id):
     """
     Returns the absolute folder path for a given date (YYYY-MM-DD) and camera_id,
-    e.g. MEDIA_ROOT/2025-06-04/cam0
+    e.g. <storage root>/2025-06-04/cam0, searching every configured storage root.
     """
-    base = settings.MEDIA_ROOT
-    folder = os.path.join(base, date_str, camera_id)
-    if os.path.isdir(folder):
+    folder = find_camera_folder(date_str, camera_id)
+    if folder:
         return folder
     raise Http404(f"Folder not found for date='{date_str}', camera='{camera_id}'")
 
-# === 1) List available dates (directories under MEDIA_ROOT) ===
+def list_subdirs(path):
+    """
+    Returns the names of subdirectories of path ([] if path is missing).
+    """
+    try:
+        return [name for name in os.listdir(path)
+                if os.path.isdir(os.path.join(path, name))]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+def is_date_name(name):
+    """
+    True if name is a YYYY-MM-DD date folder name.
+    """
+    try:
+        datetime.datetime.strptime(name, "%Y-%m-%d")
+        return True
+    except (ValueError, TypeError):
+        return False
+
+# === 1) List available dates (directories under every storage root) ===
 @require_GET
 def list_dates(request):
     """
     GET /api/dates/
     Returns JSON: { "dates": ["2025-06-04", "2025-06-05", ...] }
     """
-    media_root = settings.MEDIA_ROOT
-    try:
-        all_entries = os.listdir(media_root)
-    except FileNotFoundError:
-        all_entries = []
-
-    dates = []
-    for name in all_entries:
-        full_path = os.path.join(media_root, name)
-        try:
-            if os.path.isdir(full_path):
-                datetime.datetime.strptime(name, "%Y-%m-%d")
-                dates.append(name)
-        except (ValueError, TypeError):
-            continue
+    dates = set()
+    for root in get_media_roots():
+        dates.update(name for name in list_subdirs(root) if is_date_name(name))
 
-    dates.sort(reverse=True)
-    return JsonResponse({"dates": dates})
+    return JsonResponse({"dates": sorted(dates, reverse=True)})
 
 # === 2) List available cameras for a given date ===
 @require_GET
@@ -53,14 +66,17 @@ def list_cameras_for_date(request, date_str):
     GET /api/dates/<date_str>/cameras/
     Returns JSON: { "cameras": ["cam0", "cam1", ...] }
     """
-    date_folder = os.path.join(settings.MEDIA_ROOT, date_str)
-    if not os.path.isdir(date_folder):
+    cameras = set()
+    found = False
+    for root in get_media_roots():
+        date_folder = os.path.join(root, date_str)
+        if os.path.isdir(date_folder):
+            found = True
+            cameras.update(list_subdirs(date_folder))
+    if not found:
         raise Http404(f"Date '{date_str}' not found.")
 
-    cameras = [name for name in os.listdir(date_folder)
-               if os.path.isdir(os.path.join(date_folder, name))]
-    cameras.sort()
-    return JsonResponse({"cameras": cameras})
+    return JsonResponse({"cameras": sorted(cameras)})
 
 # === 3) Return metadata_index.json for <date>/<camera> ===
 @require_GET
@@ -135,25 +151,99 @@ def all_streams_manifest(request):
         }
       }
     """
-    media_root = settings.MEDIA_ROOT
-    manifest = {}
-    try:
-        for date_str in os.listdir(media_root):
-            full_date = os.path.join(media_root, date_str)
-            try:
-                datetime.datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
+    merged = {}
+    for root in get_media_roots():
+        for date_str in list_subdirs(root):
+            if not is_date_name(date_str):
                 continue
-            if not os.path.isdir(full_date):
-                continue
-
-            cams = [
-                cam for cam in os.listdir(full_date)
-                if os.path.isdir(os.path.join(full_date, cam))
-            ]
+            cams = list_subdirs(os.path.join(root, date_str))
             if cams:
-                manifest[date_str] = sorted(cams)
-    except FileNotFoundError:
-        pass
+                merged.setdefault(date_str, set()).update(cams)
 
+    manifest = {date_str: sorted(cams) for date_str, cams in merged.items()}
     return JsonResponse({"dates": manifest})
+
+# === 7) Map a wall-clock timestamp to a segment ===
+@lru_cache(maxsize=64)
+def load_seek_index(index_path, mtime_ns):
+    """
+    Parses a seek index once per (path, mtime) and returns (rows, starts).
+    Rows are appended in capture order, so starts is already sorted.
+    Raises ValueError if the file isn't a list of
+    [segment, start_ts, duration, media_duration] rows.
+    """
+    with open(index_path, 'r') as f:
+        rows = json.load(f)
+    if not isinstance(rows, list) or not all(
+        isinstance(row, list) and len(row) == 4
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in row)
+        for row in rows
+    ):
+        raise ValueError(f"{index_path} has an unexpected row shape.")
+    return rows, [row[1] for row in rows]
+
+@require_GET
+def seek_segment(request, date_str, camera_id):
+    """
+    GET /api/streams/<date_str>/<camera_id>/seek/?t=<unix_ts>
+    Bisects the camera's seek index and returns:
+      {
+        "segment": 23,
+        "offset": 1.27,          # seconds into segment_00023.ts (playback time)
+        "start_ts": 1749110400.125,
+        "duration": 2.004,       # wall-clock span of the segment
+        "segment_file": "segment_00023.ts",
+        "metadata_file": "segment_00023.json"
+      }
+    """
+    try:
+        t = float(request.GET["t"])
+    except (KeyError, ValueError):
+        t = None
+    if t is None or not math.isfinite(t):
+        return JsonResponse({"error": "Query parameter 't' (UNIX timestamp) is required."}, status=400)
+
+    folder = get_camera_folder(date_str, camera_id)
+    index_path = os.path.join(folder, SEEK_INDEX_FILE)
+    try:
+        rows, starts = load_seek_index(index_path, os.stat(index_path).st_mtime_ns)
+    except FileNotFoundError:
+        raise Http404(f"{SEEK_INDEX_FILE} not found.")
+    except ValueError:
+        return JsonResponse({"error": f"{SEEK_INDEX_FILE} is unreadable."}, status=503)
+
+    pos = bisect.bisect_right(starts, t) - 1
+    if pos < 0:
+        raise Http404(f"No segment covers t={t}.")
+
+    segment, start_ts, duration, media_duration = rows[pos]
+    offset = t - start_ts
+    if offset >= duration:
+        # Capture jitter can leave a sliver between back-to-back rows; only a
+        # real outage (or the end of the index) is a miss
+        next_start = starts[pos + 1] if pos + 1 < len(starts) else None
+        if next_start is None or next_start - (start_ts + duration) > SEEK_MAX_GAP:
+            raise Http404(f"No segment covers t={t}.")
+        offset = duration
+
+    # Frames are spread evenly over the segment's playback time
+    media_offset = offset * media_duration / duration if duration > 0 else 0.0
+    return JsonResponse({
+        "segment": segment,
+        "offset": round(media_offset, 3),
+        "start_ts": start_ts,
+        "duration": duration,
+        "segment_file": f"segment_{segment:05d}.ts",
+        "metadata_file": f"segment_{segment:05d}.json"
+    })
+
+# === Serve /media/ from whichever storage root holds the file (DEBUG only) ===
+def serve_media(request, path):
+    """
+    Development stand-in for nginx's multi-root /media/ location.
+    """
+    roots = get_media_roots()
+    for root in roots:
+        if os.path.isfile(os.path.join(root, path)):
+            return serve(request, path, document_root=root)
+    return serve(request, path, document_root=roots[0])
@@ -15,7 +15,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'streams',
+    'streams.apps.StreamsConfig',
 ]
 
 MIDDLEWARE = [
@@ -70,6 +70,18 @@ STATIC_URL = '/static/'
 # -------------------
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+
+# Storage sharding: spread cameras across several roots (e.g. one per disk).
+# Every root keeps the same <YYYY-MM-DD>/<camera_id>/ layout; the API and
+# nginx merge them back into a single /media/ view.
+MEDIA_ROOTS = [MEDIA_ROOT]
+# Optional explicit placement, camera_id -> index into MEDIA_ROOTS, e.g.
+#   CAMERA_STORAGE_MAP = {'cam0': 0, 'cam1': 1}
+# Cameras not listed are placed by a stable hash of their id.
+CAMERA_STORAGE_MAP = {}
+
+# Address nginx listens on (used by `manage.py nginx_server --write-config`).
+NGINX_LISTEN = '10.23.89.245:12345'
 # The camera_data folder will live under MEDIA_ROOT:
 #   <PROJECT_ROOT>/media/camera_data/
 
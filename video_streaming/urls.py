@@ -1,13 +1,14 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from streams.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('streams.urls')),  # include all our streaming endpoints
 ]
 
-# In DEBUG, serve /media/ directly. In production, offload to nginx.
+# In DEBUG, serve /media/ directly (across all MEDIA_ROOTS). In production, offload to nginx.
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    media_prefix = settings.MEDIA_URL.lstrip('/')
+    urlpatterns += [re_path(rf'^{media_prefix}(?P<path>.*)$', serve_media)]